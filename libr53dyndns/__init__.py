@@ -1,4 +1,5 @@
 from libr53dyndns.config import DynConfig
+from libr53dyndns.inventory import Inventory
 from libr53dyndns.ipget import IPGet
 from libr53dyndns.r53 import R53
 
@@ -10,3 +10,6 @@ class InvalidInputError(Exception):
 
 class InvalidURL(Exception):
     pass
+
+class WorkerError(Exception):
+    pass
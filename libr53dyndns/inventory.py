@@ -0,0 +1,163 @@
+from libr53dyndns.config import DynConfig
+from libr53dyndns.errors import InvalidInputError
+import csv
+import json
+import logging
+import os
+import sqlite3
+
+LOG = logging.getLogger('r53-dyndns')
+
+class Inventory(object):
+    """
+    Stream fqdn entries from a JSONL, CSV or SQLite inventory instead of
+    listing them all in the config file.  Each entry is a fqdn and any
+    options for it (zone, ttl, accesskey, etc.).  Anything not set in an
+    entry is inherited from the [DEFAULT] section of the config
+    """
+    jsonl_exts = ('.jsonl',)
+    csv_exts = ('.csv',)
+    sqlite_exts = ('.db', '.sqlite', '.sqlite3')
+    # The table to read from in a SQLite inventory
+    sqlite_table = 'fqdns'
+
+    def __init__(self, path, defaults=None, chunksize=1000):
+        """
+        Set up some instance variables.  Nothing is read until the
+        inventory is iterated over
+
+        path:str        The path to the inventory file.  The format is
+                        determined by the file extension
+        defaults:dict   The defaults for every entry, usually the
+                        defaults() of the main config
+        chunksize:int   The max number of entries in a chunk
+        """
+        self.path = path
+        self.defaults = dict(defaults or {})
+        self.chunksize = int(chunksize)
+
+    def __iter__(self):
+        """
+        Yields a dict of options, including the fqdn, for each entry in
+        the inventory
+        """
+        for num, entry in self._get_reader()():
+            if not isinstance(entry, dict):
+                raise InvalidInputError('Inventory entry {} in {} is not '
+                    'an object: {}'.format(num, self.path, entry))
+            if None in entry:
+                raise InvalidInputError('Inventory entry {} in {} has more '
+                    'fields than the header'.format(num, self.path))
+            entry = dict((str(k).lower(), str(v)) for k, v in entry.items()
+                if v is not None and v != '')
+            if 'fqdn' not in entry:
+                raise InvalidInputError('Inventory entry {} without a fqdn '
+                    'in {}: {}'.format(num, self.path, entry))
+            if 'zone' not in entry and 'zone' not in self.defaults:
+                raise InvalidInputError('No zone defined for {} (entry {}) '
+                    'in {}'.format(entry['fqdn'], num, self.path))
+            yield entry
+
+    def chunks(self, select=None):
+        """
+        Yields a DynConfig for each chunk of up to chunksize entries in the
+        same zone, with a section per fqdn.  A new chunk is started whenever
+        the zone changes, so the inventory should be sorted by zone and a
+        warning is logged if it isn't.  SQLite inventories are sorted on
+        read if they have a zone column
+
+        select:callable     If set, only entries for which select(zone)
+                            returns True are included
+        """
+        zone = None
+        done_zones = set()
+        warned = False
+        chunk = {}
+        for entry in self:
+            entry_zone = entry.get('zone', self.defaults.get('zone'))
+            if select is not None and not select(entry_zone):
+                continue
+            if entry_zone != zone:
+                if entry_zone in done_zones and not warned:
+                    LOG.warning('{} is not sorted by zone, {} appears more '
+                        'than once which means more chunks and zone '
+                        'listings'.format(self.path, entry_zone))
+                    warned = True
+                if zone is not None:
+                    done_zones.add(zone)
+            if chunk and (entry_zone != zone or
+                    len(chunk) >= self.chunksize):
+                yield self._get_config(chunk)
+                chunk = {}
+            zone = entry_zone
+            fqdn = entry.pop('fqdn')
+            if fqdn in chunk:
+                LOG.warning('Duplicate inventory entry for {} in {}, using '
+                    'the last one'.format(fqdn, self.path))
+                del chunk[fqdn]
+            chunk[fqdn] = entry
+
+        if chunk:
+            yield self._get_config(chunk)
+
+    def _get_config(self, chunk):
+        conf = DynConfig(defaults=self.defaults)
+        for fqdn, entry in chunk.items():
+            conf.add_section(fqdn)
+            for key, val in entry.items():
+                conf.set(fqdn, key, val)
+
+        return conf
+
+    def _get_reader(self):
+        ext = os.path.splitext(self.path)[1].lower()
+        if ext in self.jsonl_exts:
+            return self._read_jsonl
+        elif ext in self.csv_exts:
+            return self._read_csv
+        elif ext in self.sqlite_exts:
+            return self._read_sqlite
+
+        raise InvalidInputError('Unknown inventory type for {}'.format(
+            self.path))
+
+    def _read_jsonl(self):
+        """
+        Yields a (line number, entry) tuple for each line
+        """
+        with open(self.path) as fh:
+            for num, line in enumerate(fh, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield (num, json.loads(line))
+                except ValueError as e:
+                    raise InvalidInputError('Could not parse line {} in '
+                        '{}: {}'.format(num, self.path, e))
+
+    def _read_csv(self):
+        """
+        Yields a (line number, entry) tuple for each row
+        """
+        with open(self.path, newline='') as fh:
+            reader = csv.DictReader(fh)
+            for row in reader:
+                yield (reader.line_num, row)
+
+    def _read_sqlite(self):
+        """
+        Yields a (row number, entry) tuple for each row
+        """
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        try:
+            query = 'SELECT * FROM {}'.format(self.sqlite_table)
+            cols = [row['name'] for row in conn.execute(
+                'PRAGMA table_info({})'.format(self.sqlite_table))]
+            if 'zone' in (c.lower() for c in cols):
+                query += ' ORDER BY zone'
+            for num, row in enumerate(conn.execute(query), 1):
+                yield (num, dict(zip(row.keys(), row)))
+        finally:
+            conn.close()
@@ -4,13 +4,17 @@ import time
 import socket
 import re
 
-from libr53dyndns.errors import InvalidInputError
+from libr53dyndns.errors import InvalidInputError, ZoneNotFoundError
 
 class R53(object):
     """
     Wrap the boto Route53 interface with some specific convenience
     operations
     """
+    # Route53 allows 1000 resource records and 32000 characters of record
+    # values per ChangeBatch and counts each UPSERT twice towards both
+    max_batch_records = 1000
+    max_batch_chars = 32000
     
     def __init__(self, fqdn, zone, ak, sk, ttl=60):
         """
@@ -92,6 +96,68 @@ class R53(object):
 
         return resp
 
+    def get_zone_ips(self, v4=True):
+        """
+        Returns a dict of fqdn -> ip for all the A (or AAAA) records in
+        the zone.  This pages through the zone rather than doing a lookup
+        per fqdn
+        """
+        rtype = 'A' if v4 else 'AAAA'
+        ret = {}
+        pager = self._r53.get_paginator('list_resource_record_sets')
+        for page in pager.paginate(HostedZoneId=self._get_zone_id()):
+            for rrset in page['ResourceRecordSets']:
+                if rrset['Type'] != rtype or not rrset.get('ResourceRecords'):
+                    continue
+                name = self._pretty_dns_name(rrset['Name'].rstrip('.'))
+                ret[name.lower()] = rrset['ResourceRecords'][0]['Value']
+
+        return ret
+
+    def update_batch(self, records, v4=True):
+        """
+        Update many fqdns in the zone using as few ChangeBatch calls
+        as possible
+
+        records:dict    A dict of fqdn -> (ip, ttl) to update
+        v4:bool         If True, update A records, otherwise AAAA records
+
+        returns list    Returns the list of responses, one per batch
+        """
+        batches = []
+        batch = []
+        num_records = num_chars = 0
+        for fqdn, (ip, ttl) in sorted(records.items()):
+            if batch and (
+                    num_records + 2 > self.max_batch_records or
+                    num_chars + 2 * len(ip) > self.max_batch_chars):
+                batches.append(batch)
+                batch = []
+                num_records = num_chars = 0
+
+            chg = self._get_chg_frame(fqdn, ttl)
+            if not v4:
+                chg['ResourceRecordSet']['Type'] = 'AAAA'
+            chg['ResourceRecordSet']['ResourceRecords'].append({'Value': ip})
+            batch.append(chg)
+            num_records += 2
+            num_chars += 2 * len(ip)
+
+        if batch:
+            batches.append(batch)
+
+        resps = []
+        for batch in batches:
+            resps.append(self._r53.change_resource_record_sets(
+                HostedZoneId=self._get_zone_id(),
+                ChangeBatch={
+                    'Comment': 'Updated at {0}'.format(time.ctime()),
+                    'Changes': batch,
+                },
+            ))
+
+        return resps
+
     def _get_record_ip(self, v4=True):
         """
         Gets the Record object for the fqdn
@@ -131,16 +197,16 @@ class R53(object):
         raise ZoneNotFoundError('Could not find the zone: {0}'.format(
             self.zone))
     
-    def _get_chg_frame(self):
+    def _get_chg_frame(self, fqdn=None, ttl=None):
         """
         This gets a baseline setup change batch
         """
         chg_framework = {
             'Action': 'UPSERT',
             'ResourceRecordSet': {
-                'Name': self.fqdn,
+                'Name': self.fqdn if fqdn is None else fqdn.lower(),
                 'Type': 'A',
-                'TTL': self.ttl,
+                'TTL': self.ttl if ttl is None else int(ttl),
                 'ResourceRecords': [],
             },
         }
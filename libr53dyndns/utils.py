@@ -3,6 +3,8 @@
 Define some utility functions
 """
 
+from ipaddress import IPv6Address, IPv6Network
+from libr53dyndns.errors import InvalidInputError
 import os, sys, pwd, grp
 
 def get_uid_gid(user, group):
@@ -15,6 +17,50 @@ def get_uid_gid(user, group):
     return (uid, gid)
 
 
+def ipv6_from_prefix(ip, prefixlen, suffix):
+    """
+    Derive a host address from the delegated prefix that ip lives in and
+    the interface id (suffix) for the host
+
+    ip:str          An IPv6 address from within the delegated prefix
+    prefixlen:int   The length of the delegated prefix, usually 56 or 64
+    suffix:str      The interface id/suffix for the host, such as "::1" or
+                    "::dead:beef"
+
+    returns str     Returns the derived IPv6 address as a string
+    """
+    net = IPv6Network('{}/{}'.format(ip, prefixlen), strict=False)
+    host = int(IPv6Address(suffix))
+    if host & int(net.netmask):
+        raise InvalidInputError('The suffix {} does not fit in the host '
+            'portion of a /{} prefix'.format(suffix, net.prefixlen))
+
+    return str(IPv6Address(int(net.network_address) | host))
+
+
+def shard(items, key, num):
+    """
+    Split the items into at most num shards.  All the items with the same
+    key will end up in the same shard and the groups are spread out so the
+    shards are as close to the same size as possible
+
+    items:list      The items to shard
+    key:callable    A function which returns the grouping key for an item
+    num:int         The maximum number of shards
+
+    returns list    Returns a list of lists of items
+    """
+    groups = {}
+    for item in items:
+        groups.setdefault(key(item), []).append(item)
+
+    shards = [[] for i in range(min(num, len(groups)))]
+    for group in sorted(groups.values(), key=len, reverse=True):
+        min(shards, key=len).extend(group)
+
+    return shards
+
+
 def drop_privs(user, group):
     uid, gid = get_uid_gid(user, group)
     os.setregid(gid, gid)
@@ -7,15 +7,25 @@ record with your dynamic ip when the IP changes
 
 from argparse import ArgumentParser
 from libr53dyndns.utils import daemonize, write_pid, create_log_dir, drop_privs
+from libr53dyndns.utils import ipv6_from_prefix, shard
+from libr53dyndns.errors import InvalidInputError, WorkerError
 from logging.handlers import TimedRotatingFileHandler
 from configparser import NoOptionError
+from functools import partial
+from queue import Empty
 import libr53dyndns as r53
+import multiprocessing as mp
 import traceback
+import zlib
 import os, logging, time, sys
 
 __version__ = r53.__version__
 
 LOG = None
+# The number of times a crashed shard worker will be restarted per run
+MAX_RESTARTS = 3
+# Workers are forked so that they share the config and logger
+MP = mp.get_context('fork')
 
 def get_args():
     p = ArgumentParser()
@@ -34,6 +44,11 @@ def get_args():
         'written to the log file only when running as a daemon.  This will '
         'override the non-daemon behavior of logging to the terminal '
         '[default: %(default)s]')
+    p.add_argument('-w', '--workers', type=int, default=1, metavar='INT',
+        dest='workers', help='The number of worker processes to spread the '
+        'fqdns across.  The fqdns are sharded by credentials and zone and '
+        'the IPs are only looked up once in the parent process.  This is '
+        'only useful with a large number of fqdns [default: %(default)s]')
     p.add_argument('-D', '--debug', action='store_true', default=False,
         dest='debug', help='Output debugging info [default: %(default)s]')
     p.add_argument('-V', '--version', action='store_true', default=False,
@@ -119,7 +134,68 @@ def run(args, conf):
     if cur_ipv6:
         LOG.debug('Current external IPv6: {}'.format(cur_ipv6))
 
-    for fqdn in conf.getlist('main', 'fqdns'):
+    ip_args = (cur_ipv4, cur_ipv6, upd_v4, upd_v6)
+    fqdns = []
+    if conf.has_option('main', 'fqdns'):
+        fqdns = conf.getlist('main', 'fqdns')
+    inventory = get_inventory(conf)
+    if args.workers > 1:
+        stats = run_sharded(conf, args.workers, fqdns, inventory, ip_args)
+        LOG.info('Checked {checked} fqdns and made {updated} updates in '
+            '{shards} shards with {restarts} worker restarts and {failed} '
+            'failed shards'.format(**stats))
+        if stats['failed']:
+            raise WorkerError('{} of {} shards failed'.format(
+                stats['failed'], stats['shards']))
+    else:
+        update_shard(conf, fqdns, inventory, (0, 1), *ip_args)
+
+def get_inventory(conf):
+    """
+    Returns an Inventory if one is configured, otherwise None
+    """
+    if not conf.has_option('main', 'inventory'):
+        return None
+    try:
+        chunksize = conf.getint('main', 'inventorychunksize')
+    except NoOptionError:
+        chunksize = 1000
+
+    return r53.Inventory(conf.get('main', 'inventory'), conf.defaults(),
+        chunksize)
+
+def update_fqdns(conf, fqdns, cur_ipv4, cur_ipv6, upd_v4, upd_v6,
+        zone_cache=None):
+    """
+    Check and update the records for each of the fqdns given the current
+    external IPs.  If a zone_cache is passed in, as it is for inventory
+    chunks, every record is checked against a cached zone listing and
+    updated in batches instead of one fqdn at a time.  Returns a dict with
+    the number of fqdns checked and records updated
+    """
+    stats = {'checked': 0, 'updated': 0}
+    if zone_cache is not None:
+        stats['checked'] = len(fqdns)
+        if cur_ipv4 and upd_v4:
+            stats['updated'] += update_zone_records(conf, fqdns, True,
+                lambda fqdn: cur_ipv4, zone_cache)
+        if cur_ipv6 and upd_v6:
+            stats['updated'] += update_zone_records(conf, fqdns, False,
+                partial(get_ipv6, conf, cur_ipv6), zone_cache)
+        return stats
+
+    prefix_fqdns = []
+    for fqdn in fqdns:
+        stats['checked'] += 1
+        prefix = False
+        if cur_ipv6 and upd_v6 and conf.has_option(fqdn, 'ipv6suffix'):
+            # These are derived from the delegated prefix and updated in
+            # batches below
+            prefix_fqdns.append(fqdn)
+            prefix = True
+            if not upd_v4:
+                continue
+
         r53_obj = r53.R53(fqdn, conf.get(fqdn, 'zone'),
             conf.get(fqdn, 'accesskey'), conf.get(fqdn, 'secretkey'),
             conf.getint(fqdn, 'ttl'))
@@ -131,14 +207,261 @@ def run(args, conf):
                 LOG.info('Changing IPv4 for {} from {} to {}'.format(
                     fqdn, r53_ip, cur_ipv4))
                 r53_obj.update(cur_ipv4)
+                stats['updated'] += 1
 
-        if cur_ipv6 and upd_v6:
+        if cur_ipv6 and upd_v6 and not prefix:
             r53_ip = r53_obj.get_ip_r53(False)
             LOG.debug('Current IPv6 for {}: {}'.format(fqdn, r53_ip))
             if r53_ip != cur_ipv6:
                 LOG.info('Changing IPv6 for {} from {} to {}'.format(
                     fqdn, r53_ip, cur_ipv6))
                 r53_obj.update(ipv6=cur_ipv6)
+                stats['updated'] += 1
+
+    if prefix_fqdns:
+        stats['updated'] += update_prefix_fqdns(conf, cur_ipv6, prefix_fqdns)
+
+    return stats
+
+def get_ipv6(conf, cur_ipv6, fqdn):
+    """
+    Returns the IPv6 address for the fqdn.  If the fqdn has an ipv6suffix,
+    the address is derived from the delegated prefix that cur_ipv6 lives
+    in, otherwise it is just cur_ipv6
+    """
+    if not conf.has_option(fqdn, 'ipv6suffix'):
+        return cur_ipv6
+    try:
+        prefixlen = conf.getint(fqdn, 'ipv6prefixlen')
+    except NoOptionError:
+        prefixlen = 64
+
+    return ipv6_from_prefix(cur_ipv6, prefixlen, conf.get(fqdn, 'ipv6suffix'))
+
+def update_prefix_fqdns(conf, cur_ipv6, fqdns, zone_cache=None):
+    """
+    Derive the AAAA record for each of the fqdns from the delegated prefix
+    that cur_ipv6 lives in and the configured ipv6suffix for the fqdn,
+    updating them in batches with update_zone_records.  Returns the number
+    of fqdns updated
+    """
+    return update_zone_records(conf, fqdns, False,
+        partial(get_ipv6, conf, cur_ipv6), zone_cache)
+
+def update_zone_records(conf, fqdns, v4, get_ip, zone_cache=None):
+    """
+    Update the A (or AAAA) records for the fqdns to the ip returned by
+    get_ip(fqdn).  The fqdns are grouped by zone and credentials so that
+    each group only needs a single zone listing and as few change batches
+    as possible.  If a zone_cache dict is passed in, the R53 object and
+    zone listings for each group are kept in it so that later calls for
+    the same group don't list the zone again.  Returns the number of
+    fqdns updated
+    """
+    if zone_cache is None:
+        zone_cache = {}
+    rtype = 'IPv4' if v4 else 'IPv6'
+    updated = 0
+    groups = {}
+    for fqdn in fqdns:
+        key = (
+            conf.get(fqdn, 'zone'),
+            conf.get(fqdn, 'accesskey'),
+            conf.get(fqdn, 'secretkey'),
+        )
+        groups.setdefault(key, []).append(fqdn)
+
+    for key, group in groups.items():
+        zone = key[0].lower()
+        try:
+            if key not in zone_cache:
+                zone_cache[key] = (r53.R53(group[0], zone, key[1], key[2],
+                    conf.getint(group[0], 'ttl')), {})
+            r53_obj, listings = zone_cache[key]
+            if v4 not in listings:
+                listings[v4] = r53_obj.get_zone_ips(v4)
+            r53_ips = listings[v4]
+        except Exception as e:
+            LOG.error('Could not list the records in {}: {}'.format(zone, e))
+            continue
+
+        changes = {}
+        for fqdn in group:
+            name = fqdn.lower()
+            # A name outside of the zone would fail the whole batch
+            if name != zone and not name.endswith('.' + zone):
+                LOG.error('Skipping {} since it is not in the zone '
+                    '{}'.format(fqdn, zone))
+                continue
+            try:
+                ip = get_ip(fqdn)
+            except (InvalidInputError, ValueError) as e:
+                LOG.error('Skipping bad {} for {}: {}'.format(rtype, fqdn, e))
+                continue
+            r53_ip = r53_ips.get(name)
+            LOG.debug('Current {} for {}: {}'.format(rtype, fqdn, r53_ip))
+            if r53_ip != ip:
+                LOG.info('Changing {} for {} from {} to {}'.format(
+                    rtype, fqdn, r53_ip, ip))
+                changes[fqdn] = (ip, conf.getint(fqdn, 'ttl'))
+
+        if not changes:
+            continue
+        # Route53 applies each batch all or nothing, so a failure here
+        # only skips this group
+        try:
+            r53_obj.update_batch(changes, v4)
+        except Exception as e:
+            LOG.error('Could not update the {} records in {}: {}'.format(
+                rtype, zone, e))
+            continue
+        r53_ips.update((fqdn.lower(), ip)
+            for fqdn, (ip, ttl) in changes.items())
+        updated += len(changes)
+
+    return updated
+
+def update_inventory(inventory, part, cur_ipv4, cur_ipv6, upd_v4, upd_v6):
+    """
+    Check and update the fqdns in the inventory one chunk at a time.  The
+    A and AAAA listings for a zone are reused for consecutive chunks of
+    the same zone, so only a single chunk and a single zone's listings
+    are held in memory.  The part is an (idx, num) tuple and only the
+    zones that hash to idx are handled, so each zone is handled by a
+    single worker.
+    Returns a dict with the number of fqdns checked and records updated
+    """
+    idx, num = part
+    stats = {'checked': 0, 'updated': 0}
+    zone_cache = {}
+    last_zone = None
+
+    def select(zone):
+        return zlib.crc32(zone.lower().encode('utf-8')) % num == idx
+
+    for chunk in inventory.chunks(select if num > 1 else None):
+        zone = chunk.get(chunk.sections()[0], 'zone')
+        if zone != last_zone:
+            zone_cache.clear()
+            last_zone = zone
+        chunk_stats = update_fqdns(chunk, chunk.sections(), cur_ipv4,
+            cur_ipv6, upd_v4, upd_v6, zone_cache)
+        stats['checked'] += chunk_stats['checked']
+        stats['updated'] += chunk_stats['updated']
+
+    return stats
+
+def update_shard(conf, fqdns, inventory, part, *ip_args):
+    """
+    Update a shard of the fqdns from the config and, if there is an
+    inventory, the given part of the inventory.  Returns the combined
+    stats
+    """
+    stats = {'checked': 0, 'updated': 0}
+    results = []
+    if fqdns:
+        results.append(update_fqdns(conf, fqdns, *ip_args))
+    if inventory is not None:
+        results.append(update_inventory(inventory, part, *ip_args))
+    for res in results:
+        stats['checked'] += res['checked']
+        stats['updated'] += res['updated']
+
+    return stats
+
+def run_sharded(conf, workers, fqdns, inventory, ip_args):
+    """
+    Split the fqdns into shards by credentials and zone and run each shard
+    in its own worker process.  If there is an inventory, its zones are
+    also spread across the same workers, with each worker streaming the
+    inventory itself, so there are never more than workers processes.
+    The IPs are looked up once by the caller and handed to each worker.
+    A worker that dies without reporting back is restarted up to
+    MAX_RESTARTS times, while a shard that raises an error is just counted
+    as failed.  Returns the aggregated stats for all the shards
+    """
+    fqdn_shards = shard(fqdns, lambda fqdn: (
+            conf.get(fqdn, 'accesskey'),
+            conf.get(fqdn, 'secretkey'),
+            conf.get(fqdn, 'zone'),
+        ), workers)
+    num = workers if inventory is not None else len(fqdn_shards)
+    fqdn_shards.extend([] for i in range(num - len(fqdn_shards)))
+    shards = [partial(update_shard, conf, shard_fqdns, inventory, (idx, num))
+        for idx, shard_fqdns in enumerate(fqdn_shards)]
+    stats = {
+        'checked': 0,
+        'updated': 0,
+        'shards': len(shards),
+        'restarts': 0,
+        'failed': 0,
+    }
+    queue = MP.Queue()
+
+    def start(idx):
+        proc = MP.Process(target=shard_worker,
+            args=(idx, queue, shards[idx]) + ip_args)
+        proc.start()
+        return proc
+
+    def add_result(idx, shard_stats, err):
+        if err is not None:
+            stats['failed'] += 1
+            LOG.error('Error updating shard {}: {}'.format(idx, err))
+        else:
+            stats['checked'] += shard_stats['checked']
+            stats['updated'] += shard_stats['updated']
+
+    procs = {idx: start(idx) for idx in range(len(shards))}
+    restarts = dict.fromkeys(procs, 0)
+    while procs:
+        try:
+            add_result(*queue.get(timeout=1))
+        except Empty:
+            pass
+
+        for idx, proc in list(procs.items()):
+            if proc.is_alive():
+                continue
+            proc.join()
+            del procs[idx]
+            if proc.exitcode == 0:
+                continue
+            # The worker died without reporting back, such as being killed
+            # by a signal, so start the shard over
+            if restarts[idx] < MAX_RESTARTS:
+                restarts[idx] += 1
+                stats['restarts'] += 1
+                LOG.warning('Worker for shard {} exited with {}, '
+                    'restarting'.format(idx, proc.exitcode))
+                procs[idx] = start(idx)
+            else:
+                stats['failed'] += 1
+                LOG.error('Worker for shard {} died {} times, giving '
+                    'up'.format(idx, restarts[idx] + 1))
+
+    # Pick up any results that came in after the last poll
+    while True:
+        try:
+            add_result(*queue.get(timeout=0.1))
+        except Empty:
+            break
+
+    return stats
+
+def shard_worker(idx, queue, job, *ip_args):
+    """
+    The worker process entry point for a single shard.  Errors are
+    reported back through the queue rather than restarting the shard,
+    since they would most likely just happen again
+    """
+    try:
+        stats = job(*ip_args)
+    except Exception as e:
+        LOG.debug(traceback.format_exc())
+        queue.put((idx, None, str(e)))
+    else:
+        queue.put((idx, stats, None))
 
 def main():
     args = get_args()
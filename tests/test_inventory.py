@@ -0,0 +1,169 @@
+from libr53dyndns.errors import InvalidInputError
+from libr53dyndns.inventory import Inventory
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+class TestInventory(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.defaults = {'ttl': '60', 'accesskey': 'AK', 'secretkey': 'SK'}
+        self.entries = [
+            {'fqdn': 'a.example.com', 'zone': 'example.com'},
+            {'fqdn': 'b.example.com', 'zone': 'example.com', 'ttl': '120'},
+            {'fqdn': 'c.example.com', 'zone': 'example.com'},
+            {'fqdn': 'a.other.com', 'zone': 'other.com'},
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_jsonl(self):
+        path = os.path.join(self.tmpdir, 'inv.jsonl')
+        with open(path, 'w') as fh:
+            for entry in self.entries:
+                fh.write(json.dumps(entry) + '\n')
+
+        self._check_chunks(path)
+
+    def test_csv(self):
+        path = os.path.join(self.tmpdir, 'inv.csv')
+        with open(path, 'w') as fh:
+            fh.write('fqdn,zone,ttl\n')
+            for entry in self.entries:
+                fh.write('{fqdn},{zone},{}\n'.format(entry.get('ttl', ''),
+                    **entry))
+
+        self._check_chunks(path)
+
+    def test_sqlite(self):
+        path = os.path.join(self.tmpdir, 'inv.db')
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE TABLE fqdns (fqdn TEXT, zone TEXT, ttl INT)')
+        # Insert out of zone order, these should be sorted on read
+        for entry in reversed(self.entries):
+            conn.execute('INSERT INTO fqdns VALUES (?, ?, ?)',
+                (entry['fqdn'], entry['zone'], entry.get('ttl')))
+        conn.commit()
+        conn.close()
+
+        chunks = list(Inventory(path, self.defaults, 2).chunks())
+        self.assertEqual([len(c.sections()) for c in chunks], [2, 1, 1])
+        self.assertEqual(chunks[0].getint('b.example.com', 'ttl'), 120)
+
+    def test_sqlite_no_zone_column(self):
+        path = os.path.join(self.tmpdir, 'inv.db')
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE TABLE fqdns (fqdn TEXT)')
+        conn.execute("INSERT INTO fqdns VALUES ('a.example.com')")
+        conn.commit()
+        conn.close()
+        self.defaults['zone'] = 'example.com'
+
+        chunks = list(Inventory(path, self.defaults).chunks())
+        self.assertEqual(chunks[0].sections(), ['a.example.com'])
+        self.assertEqual(chunks[0].get('a.example.com', 'zone'),
+            'example.com')
+
+    def test_duplicates(self):
+        path = os.path.join(self.tmpdir, 'inv.jsonl')
+        with open(path, 'w') as fh:
+            for entry in self.entries[:2] + [dict(self.entries[0], ttl=30)]:
+                fh.write(json.dumps(entry) + '\n')
+
+        with self.assertLogs('r53-dyndns', 'WARNING'):
+            chunks = list(Inventory(path, self.defaults).chunks())
+
+        # The last entry wins
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(sorted(chunks[0].sections()),
+            ['a.example.com', 'b.example.com'])
+        self.assertEqual(chunks[0].getint('a.example.com', 'ttl'), 30)
+
+    def test_unsorted(self):
+        path = os.path.join(self.tmpdir, 'inv.jsonl')
+        with open(path, 'w') as fh:
+            for i in range(10):
+                zone = ('example.com', 'other.com')[i % 2]
+                fh.write(json.dumps({'fqdn': 'h{}.{}'.format(i, zone),
+                    'zone': zone}) + '\n')
+
+        with self.assertLogs('r53-dyndns', 'WARNING') as logs:
+            chunks = list(Inventory(path, self.defaults).chunks())
+
+        # Only warned once
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('not sorted by zone', logs.output[0])
+        self.assertEqual(len(chunks), 10)
+
+    def test_select(self):
+        path = os.path.join(self.tmpdir, 'inv.jsonl')
+        with open(path, 'w') as fh:
+            for entry in self.entries:
+                fh.write(json.dumps(entry) + '\n')
+
+        chunks = list(Inventory(path, self.defaults).chunks(
+            lambda zone: zone == 'other.com'))
+        self.assertEqual([c.sections() for c in chunks], [['a.other.com']])
+
+    def test_csv_extra_fields(self):
+        path = os.path.join(self.tmpdir, 'inv.csv')
+        with open(path, 'w') as fh:
+            fh.write('fqdn,zone\n')
+            fh.write('a.example.com,example.com\n')
+            fh.write('b.example.com,example.com,120\n')
+
+        with self.assertRaisesRegex(InvalidInputError, 'entry 3 in'):
+            list(Inventory(path, self.defaults))
+
+    def test_jsonl_not_object(self):
+        path = os.path.join(self.tmpdir, 'inv.jsonl')
+        with open(path, 'w') as fh:
+            fh.write(json.dumps(self.entries[0]) + '\n')
+            fh.write('["a"]\n')
+
+        with self.assertRaisesRegex(InvalidInputError, 'entry 2 in'):
+            list(Inventory(path, self.defaults))
+
+    def test_jsonl_bad_json(self):
+        path = os.path.join(self.tmpdir, 'inv.jsonl')
+        with open(path, 'w') as fh:
+            fh.write('{"fqdn": \n')
+
+        with self.assertRaisesRegex(InvalidInputError, 'line 1 in'):
+            list(Inventory(path, self.defaults))
+
+    def test_missing_zone(self):
+        path = os.path.join(self.tmpdir, 'inv.jsonl')
+        with open(path, 'w') as fh:
+            fh.write(json.dumps({'fqdn': 'a.example.com'}) + '\n')
+
+        with self.assertRaises(InvalidInputError):
+            list(Inventory(path, self.defaults))
+
+    def test_unknown_type(self):
+        for name in ('inv.txt', 'inv.json'):
+            with self.assertRaises(InvalidInputError):
+                list(Inventory(os.path.join(self.tmpdir, name)))
+
+    def _check_chunks(self, path):
+        chunks = list(Inventory(path, self.defaults, 2).chunks())
+
+        # A chunk is at most 2 entries and never spans zones
+        self.assertEqual(
+            [c.sections() for c in chunks],
+            [
+                ['a.example.com', 'b.example.com'],
+                ['c.example.com'],
+                ['a.other.com'],
+            ],
+        )
+        self.assertEqual(chunks[0].get('a.example.com', 'zone'),
+            'example.com')
+        self.assertEqual(chunks[0].getint('a.example.com', 'ttl'), 60)
+        self.assertEqual(chunks[0].getint('b.example.com', 'ttl'), 120)
+        self.assertEqual(chunks[0].get('b.example.com', 'accesskey'), 'AK')
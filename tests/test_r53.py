@@ -0,0 +1,96 @@
+from libr53dyndns.r53 import R53
+from unittest.mock import MagicMock, patch
+import unittest
+
+class TestR53(unittest.TestCase):
+
+    def setUp(self):
+        with patch('libr53dyndns.r53.boto3'):
+            self.r53 = R53('a.example.com', 'example.com', 'AK', 'SK')
+        self.r53._zone_id = 'Z1'
+
+    def test_get_zone_ips(self):
+        pages = [
+            {'ResourceRecordSets': [
+                self._rrset('example.com.', 'NS', 'ns1.example.com.'),
+                self._rrset('a.example.com.', 'A', '1.2.3.4'),
+                self._rrset('a.example.com.', 'AAAA', '2001:db8::1'),
+            ]},
+            {'ResourceRecordSets': [
+                self._rrset('\\052.example.com.', 'AAAA', '2001:db8::2'),
+                self._rrset('B.example.com.', 'AAAA', '2001:db8::3'),
+                # Alias records don't have any ResourceRecords
+                {'Name': 'c.example.com.', 'Type': 'AAAA',
+                    'AliasTarget': {}},
+            ]},
+        ]
+        pager = MagicMock()
+        pager.paginate.return_value = pages
+        self.r53._r53.get_paginator.return_value = pager
+
+        self.assertEqual(self.r53.get_zone_ips(False), {
+            'a.example.com': '2001:db8::1',
+            '*.example.com': '2001:db8::2',
+            'b.example.com': '2001:db8::3',
+        })
+        self.assertEqual(self.r53.get_zone_ips(), {
+            'a.example.com': '1.2.3.4',
+        })
+        self.r53._r53.get_paginator.assert_called_with(
+            'list_resource_record_sets')
+        pager.paginate.assert_called_with(HostedZoneId='Z1')
+
+    def test_update_batch(self):
+        records = dict(('h{}.example.com'.format(i), ('2001:db8::1', 60))
+            for i in range(1200))
+        records['h0.example.com'] = ('2001:db8::2', 120)
+
+        resps = self.r53.update_batch(records, False)
+
+        calls = self.r53._r53.change_resource_record_sets.call_args_list
+        self.assertEqual(len(resps), 3)
+        self.assertEqual(
+            [len(c[1]['ChangeBatch']['Changes']) for c in calls],
+            [500, 500, 200],
+        )
+        changes = sum((c[1]['ChangeBatch']['Changes'] for c in calls), [])
+        self.assertEqual(len(changes), 1200)
+        for chg in changes:
+            self.assertEqual(chg['Action'], 'UPSERT')
+            self.assertEqual(chg['ResourceRecordSet']['Type'], 'AAAA')
+        by_name = dict((c['ResourceRecordSet']['Name'], c) for c in changes)
+        h0 = by_name['h0.example.com']['ResourceRecordSet']
+        self.assertEqual(h0['TTL'], 120)
+        self.assertEqual(h0['ResourceRecords'], [{'Value': '2001:db8::2'}])
+        self.assertEqual(
+            by_name['h1.example.com']['ResourceRecordSet']['TTL'], 60)
+
+    def test_update_batch_value_length(self):
+        # 37 character values hit the 32000 character limit before the
+        # record limit
+        ip = '2001:db8:1234:5678:a00:27ff:fe4e:66a1'
+        records = dict(('h{}.example.com'.format(i), (ip, 60))
+            for i in range(500))
+
+        self.r53.update_batch(records, False)
+
+        calls = self.r53._r53.change_resource_record_sets.call_args_list
+        sizes = [len(c[1]['ChangeBatch']['Changes']) for c in calls]
+        self.assertEqual(sizes, [432, 68])
+        for size in sizes:
+            self.assertLessEqual(size * 2 * len(ip), R53.max_batch_chars)
+
+    def test_update_batch_v4(self):
+        self.r53.update_batch({'a.example.com': ('1.2.3.4', 60)})
+
+        changes = self.r53._r53.change_resource_record_sets.call_args[1][
+            'ChangeBatch']['Changes']
+        self.assertEqual(changes[0]['ResourceRecordSet']['Type'], 'A')
+
+    def _rrset(self, name, rtype, value):
+        return {
+            'Name': name,
+            'Type': rtype,
+            'TTL': 60,
+            'ResourceRecords': [{'Value': value}],
+        }
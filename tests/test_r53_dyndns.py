@@ -0,0 +1,327 @@
+from libr53dyndns.errors import ZoneNotFoundError
+from unittest.mock import MagicMock, patch
+import importlib.util
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+import libr53dyndns as r53
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'r53-dyndns.py')
+
+
+def load_script():
+    """
+    The script isn't importable by name, so load it from the file
+    """
+    spec = importlib.util.spec_from_file_location('r53_dyndns', SCRIPT)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    mod.LOG = logging.getLogger('r53-dyndns-test')
+    mod.LOG.addHandler(logging.NullHandler())
+    mod.LOG.propagate = False
+
+    return mod
+
+
+def get_conf(conf_str):
+    conf = r53.DynConfig()
+    conf.read_string(conf_str)
+    return conf
+
+
+class TestUpdatePrefixFqdns(unittest.TestCase):
+    conf = '''
+[DEFAULT]
+ttl = 60
+accesskey = AK
+secretkey = SK
+ipv6suffix = ::1
+
+[a.example.com]
+zone = example.com
+
+[b.example.com]
+zone = example.com
+ipv6suffix = ::b
+ttl = 120
+
+[c.example.com]
+zone = example.com
+ipv6suffix = ::c
+
+[bad.example.com]
+zone = example.com
+ipv6suffix = 1::1
+
+[typo.exmaple.com]
+zone = example.com
+
+[a.other.com]
+zone = other.com
+ipv6prefixlen = 56
+ipv6suffix = 0:0:0:7::1
+
+[b.other.com]
+zone = other.com
+accesskey = AK2
+'''
+
+    def setUp(self):
+        self.mod = load_script()
+        self.conf = get_conf(self.conf)
+        self.r53_objs = {}
+        self.zone_ips = {
+            ('example.com', 'AK'): {'c.example.com': '2001:db8:1:2::c'},
+            ('other.com', 'AK'): {},
+            ('other.com', 'AK2'): {'b.other.com': '2001:db8::1'},
+        }
+
+    def test_update_prefix_fqdns(self):
+        fqdns = self.conf.sections()
+        with patch.object(self.mod.r53, 'R53', self._get_r53):
+            updated = self.mod.update_prefix_fqdns(self.conf,
+                '2001:db8:1:2::5', fqdns)
+
+        # One R53 object and zone listing per zone/credentials group
+        self.assertEqual(sorted(self.r53_objs), [
+            ('example.com', 'AK'),
+            ('other.com', 'AK'),
+            ('other.com', 'AK2'),
+        ])
+        for r53_obj in self.r53_objs.values():
+            r53_obj.get_zone_ips.assert_called_once_with(False)
+
+        # c.example.com is unchanged, bad.example.com has a bad suffix and
+        # typo.exmaple.com isn't in the zone
+        objs = self.r53_objs
+        objs[('example.com', 'AK')].update_batch.assert_called_once_with({
+            'a.example.com': ('2001:db8:1:2::1', 60),
+            'b.example.com': ('2001:db8:1:2::b', 120),
+        }, False)
+        objs[('other.com', 'AK')].update_batch.assert_called_once_with({
+            'a.other.com': ('2001:db8:1:7::1', 60),
+        }, False)
+        # The default prefix length is 64
+        objs[('other.com', 'AK2')].update_batch.assert_called_once_with({
+            'b.other.com': ('2001:db8:1:2::1', 60),
+        }, False)
+        self.assertEqual(updated, 4)
+
+    def test_update_prefix_fqdns_batch_error(self):
+        self.fail_zone = 'example.com'
+        fqdns = self.conf.sections()
+        with patch.object(self.mod.r53, 'R53', self._get_r53):
+            with self.assertLogs('r53-dyndns-test', 'ERROR'):
+                updated = self.mod.update_prefix_fqdns(self.conf,
+                    '2001:db8:1:2::5', fqdns)
+
+        # The groups after the failed one are still updated
+        for key in (('other.com', 'AK'), ('other.com', 'AK2')):
+            self.assertEqual(self.r53_objs[key].update_batch.call_count, 1)
+        self.assertEqual(updated, 2)
+
+    def _get_r53(self, fqdn, zone, ak, sk, ttl=60):
+        r53_obj = MagicMock()
+        r53_obj.get_zone_ips.return_value = dict(self.zone_ips[(zone, ak)])
+        if zone == getattr(self, 'fail_zone', None):
+            r53_obj.update_batch.side_effect = Exception('InvalidChangeBatch')
+        self.r53_objs[(zone, ak)] = r53_obj
+        return r53_obj
+
+
+def fake_update_fqdns(conf, fqdns, *ip_args):
+    """
+    Stand in for update_fqdns in the workers.  Any shard with a "crash"
+    fqdn dies without reporting back and any with an "error" fqdn raises
+    """
+    if any(fqdn.startswith('crash.') for fqdn in fqdns):
+        os._exit(1)
+    if any(fqdn.startswith('error.') for fqdn in fqdns):
+        raise ZoneNotFoundError('no zone')
+
+    return {'checked': len(fqdns), 'updated': 1}
+
+
+class TestRunSharded(unittest.TestCase):
+    conf = '''
+[DEFAULT]
+ttl = 60
+accesskey = AK
+secretkey = SK
+
+[a.example.com]
+zone = example.com
+
+[b.example.com]
+zone = example.com
+
+[a.other.com]
+zone = other.com
+
+[{}.third.com]
+zone = third.com
+'''
+    ip_args = ('1.2.3.4', None, True, False)
+
+    def setUp(self):
+        self.mod = load_script()
+
+    def test_run_sharded(self):
+        stats = self._run('a')
+
+        self.assertEqual(stats, {
+            'checked': 4,
+            'updated': 3,
+            'shards': 3,
+            'restarts': 0,
+            'failed': 0,
+        })
+
+    def test_run_sharded_crash(self):
+        stats = self._run('crash')
+
+        # The crashed shard is restarted until it gives up and the other
+        # shards are still counted
+        self.assertEqual(stats, {
+            'checked': 3,
+            'updated': 2,
+            'shards': 3,
+            'restarts': self.mod.MAX_RESTARTS,
+            'failed': 1,
+        })
+
+    def test_run_sharded_error(self):
+        stats = self._run('error')
+
+        # An error is not retried
+        self.assertEqual(stats, {
+            'checked': 3,
+            'updated': 2,
+            'shards': 3,
+            'restarts': 0,
+            'failed': 1,
+        })
+
+    def _run(self, host):
+        conf = get_conf(self.conf.format(host))
+        with patch.object(self.mod, 'update_fqdns', fake_update_fqdns):
+            return self.mod.run_sharded(conf, 3, conf.sections(), None,
+                self.ip_args)
+
+
+class TestUpdateInventory(unittest.TestCase):
+    ip_args = (None, '2001:db8:1:2::5', False, True)
+
+    def setUp(self):
+        self.mod = load_script()
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'inv.jsonl')
+        with open(self.path, 'w') as fh:
+            for i in range(5):
+                fh.write(json.dumps({'fqdn': 'h{}.example.com'.format(i),
+                    'zone': 'example.com'}) + '\n')
+            for i in range(3):
+                fh.write(json.dumps({'fqdn': 'h{}.other.com'.format(i),
+                    'zone': 'other.com'}) + '\n')
+        self.defaults = {
+            'ttl': '60',
+            'accesskey': 'AK',
+            'secretkey': 'SK',
+            'ipv6suffix': '::1',
+        }
+        self.zone_ips = {}
+        self.r53_objs = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_zone_listing_reused(self):
+        inventory = r53.Inventory(self.path, self.defaults, 2)
+        with patch.object(self.mod.r53, 'R53', self._get_r53):
+            stats = self.mod.update_inventory(inventory, (0, 1),
+                *self.ip_args)
+
+        self.assertEqual(stats, {'checked': 8, 'updated': 8})
+        # One listing per zone even though there are 5 chunks
+        self.assertEqual([o.zone for o in self.r53_objs],
+            ['example.com', 'other.com'])
+        for r53_obj in self.r53_objs:
+            r53_obj.get_zone_ips.assert_called_once_with(False)
+        self.assertEqual(
+            [c[0][0] for c in self.r53_objs[0].update_batch.call_args_list],
+            [
+                {
+                    'h0.example.com': ('2001:db8:1:2::1', 60),
+                    'h1.example.com': ('2001:db8:1:2::1', 60),
+                },
+                {
+                    'h2.example.com': ('2001:db8:1:2::1', 60),
+                    'h3.example.com': ('2001:db8:1:2::1', 60),
+                },
+                {'h4.example.com': ('2001:db8:1:2::1', 60)},
+            ],
+        )
+
+    def test_ipv4_batched(self):
+        inventory = r53.Inventory(self.path, self.defaults, 2)
+        self.zone_ips = {'h0.example.com': '1.2.3.4'}
+        with patch.object(self.mod.r53, 'R53', self._get_r53):
+            stats = self.mod.update_inventory(inventory, (0, 1), '1.2.3.4',
+                None, True, False)
+
+        # h0.example.com is already up to date
+        self.assertEqual(stats, {'checked': 8, 'updated': 7})
+        self.assertEqual([o.zone for o in self.r53_objs],
+            ['example.com', 'other.com'])
+        for r53_obj in self.r53_objs:
+            r53_obj.get_zone_ips.assert_called_once_with(True)
+            r53_obj.get_ip_r53.assert_not_called()
+            r53_obj.update.assert_not_called()
+        self.assertEqual(
+            self.r53_objs[0].update_batch.call_args_list[0][0],
+            ({'h1.example.com': ('1.2.3.4', 60)}, True),
+        )
+        self.assertEqual(
+            self.r53_objs[1].update_batch.call_args_list[0][0],
+            ({
+                'h0.other.com': ('1.2.3.4', 60),
+                'h1.other.com': ('1.2.3.4', 60),
+            }, True),
+        )
+
+    def test_zones_split_across_parts(self):
+        inventory = r53.Inventory(self.path, self.defaults, 2)
+        zones = []
+        for idx in range(2):
+            self.r53_objs = []
+            with patch.object(self.mod.r53, 'R53', self._get_r53):
+                self.mod.update_inventory(inventory, (idx, 2), *self.ip_args)
+            zones.extend(o.zone for o in self.r53_objs)
+
+        # Each zone is handled by exactly one part
+        self.assertEqual(sorted(zones), ['example.com', 'other.com'])
+
+    def test_run_sharded_workers(self):
+        conf = get_conf(TestRunSharded.conf.format('a'))
+        inventory = r53.Inventory(self.path, self.defaults)
+        with patch.object(self.mod, 'update_fqdns', fake_update_fqdns):
+            stats = self.mod.run_sharded(conf, 2, conf.sections(),
+                inventory, TestRunSharded.ip_args)
+
+        # Never more shards than workers, with the inventory spread across
+        # the same workers as the fqdns
+        self.assertEqual(stats['shards'], 2)
+        self.assertEqual(stats['checked'], 4 + 8)
+        self.assertEqual(stats['failed'], 0)
+
+    def _get_r53(self, fqdn, zone, ak, sk, ttl=60):
+        r53_obj = MagicMock()
+        r53_obj.zone = zone
+        r53_obj.get_zone_ips.return_value = dict(self.zone_ips)
+        self.r53_objs.append(r53_obj)
+        return r53_obj
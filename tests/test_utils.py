@@ -0,0 +1,37 @@
+from libr53dyndns.errors import InvalidInputError
+from libr53dyndns.utils import ipv6_from_prefix, shard
+import unittest
+
+class TestUtils(unittest.TestCase):
+
+    def test_ipv6_from_prefix(self):
+        tests = (
+            ('2001:db8:1:2::5', 64, '::1', '2001:db8:1:2::1'),
+            ('2001:db8:1:2:a:b:c:d', 64, '::dead:beef',
+                '2001:db8:1:2::dead:beef'),
+            ('2001:db8:1:2::5', 56, '0:0:0:7::1', '2001:db8:1:7::1'),
+        )
+
+        for ip, prefixlen, suffix, expected in tests:
+            self.assertEqual(ipv6_from_prefix(ip, prefixlen, suffix),
+                expected)
+
+    def test_ipv6_from_prefix_bad_suffix(self):
+        with self.assertRaises(InvalidInputError):
+            ipv6_from_prefix('2001:db8:1:2::5', 64, '1::1')
+
+    def test_shard(self):
+        items = ['a1', 'a2', 'a3', 'b1', 'b2', 'c1', 'd1']
+        shards = shard(items, lambda item: item[0], 2)
+
+        self.assertEqual(len(shards), 2)
+        self.assertEqual(sorted(sum(shards, [])), items)
+        # Items with the same key must end up in the same shard
+        for prefix in 'abcd':
+            self.assertEqual(len([s for s in shards
+                if any(i.startswith(prefix) for i in s)]), 1)
+        self.assertEqual(sorted(len(s) for s in shards), [3, 4])
+
+        # Never more shards than keys
+        self.assertEqual(len(shard(items, lambda item: item[0], 10)), 4)
+        self.assertEqual(shard([], lambda item: item, 4), [])